@@ -10,6 +10,7 @@ import toml
 
 from .api import DocumentBucketOperations
 from .config import config
+from .ddb import dynamodb_resource
 
 
 def initialize() -> DocumentBucketOperations:
@@ -24,7 +25,7 @@ def initialize() -> DocumentBucketOperations:
     # Set up your S3 Bucket for the Document Bucket
     bucket = boto3.resource("s3").Bucket(state["DocumentBucket"])
     # Set up your DynamoDB Table for the Document Bucket
-    table = boto3.resource("dynamodb").Table(state["DocumentTable"])
+    table = dynamodb_resource().Table(state["DocumentTable"])
     # ADD-ESDK-COMPLETE: Configure the Faythe CMK in the Encryption SDK
     # Pull configuration of KMS resources
     faythe_cmk = state["FaytheCMK"]
@@ -1,15 +1,70 @@
 # Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Dict, Set
+import io
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from types import MappingProxyType
+from typing import (AbstractSet, Any, BinaryIO, Dict, Iterable, Iterator, List,
+                    Optional, Set, Tuple, Union)
 
 # ADD-ESDK-COMPLETE: Add the ESDK Dependency
 import aws_encryption_sdk  # type: ignore
-from aws_encryption_sdk import KMSMasterKeyProvider  # type: ignore
+from aws_encryption_sdk import (CachingCryptoMaterialsManager,  # type: ignore
+                                KMSMasterKeyProvider, LocalCryptoMaterialsCache)
+from botocore.response import StreamingBody  # type: ignore
 
 from .model import (ContextItem, ContextQuery, DocumentBundle, PointerItem,
                     PointerQuery)
 
+#: Upper bound on in-flight S3, DynamoDB, and KMS requests for fan-out operations.
+_MAX_CONCURRENCY = 16
+#: Maximum number of keys DynamoDB accepts in a single BatchGetItem request.
+_BATCH_GET_LIMIT = 100
+#: Seconds to wait before the first retry of keys BatchGetItem left unprocessed.
+_BATCH_GET_BASE_DELAY = 0.05
+#: Upper bound, in seconds, on the wait between BatchGetItem retries.
+_BATCH_GET_MAX_DELAY = 2.0
+#: Data keys kept by the Encryption SDK's local cache, so repeat operations skip KMS.
+_DATA_KEY_CACHE_CAPACITY = 100
+#: Seconds a cached data key may be reused.
+_DATA_KEY_MAX_AGE = 600.0
+#: Number of documents a cached data key may encrypt before a fresh one is requested.
+_DATA_KEY_MAX_MESSAGES = 100
+
+
+class _PlaintextCache:
+    """
+    Thread-safe LRU cache of decrypted documents, bounded by entry count. A capacity
+    of zero disables caching.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, ...]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: Tuple[Any, ...]):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
 
 class DocumentBucketOperations:
     """
@@ -17,7 +72,13 @@ class DocumentBucketOperations:
     """
 
     # ADD-ESDK-COMPLETE: Add the ESDK Dependency
-    def __init__(self, bucket, table, master_key_provider: KMSMasterKeyProvider):
+    def __init__(
+        self,
+        bucket,
+        table,
+        master_key_provider: KMSMasterKeyProvider,
+        plaintext_cache_size: int = 0,
+    ):
         """
         Initialize a new operations object with the provided arguments.
 
@@ -26,33 +87,61 @@ class DocumentBucketOperations:
             table: DynamoDB table for storing document pointers and context keys
             master_key_provider: Encryption SDK Master Key Provider for encryption
                                  and decryption operations
+            plaintext_cache_size: number of decrypted documents to keep in memory
+                                  for repeat retrievals; 0 (the default) keeps
+                                  plaintext out of memory between calls
         """
         self.bucket = bucket
         self.table = table
         self.master_key_provider: KMSMasterKeyProvider = master_key_provider
+        self.materials_manager = CachingCryptoMaterialsManager(
+            master_key_provider=master_key_provider,
+            cache=LocalCryptoMaterialsCache(capacity=_DATA_KEY_CACHE_CAPACITY),
+            max_age=_DATA_KEY_MAX_AGE,
+            max_messages_encrypted=_DATA_KEY_MAX_MESSAGES,
+        )
+        self._plaintext_cache = _PlaintextCache(plaintext_cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=_MAX_CONCURRENCY)
 
     def _write_pointer(self, item: PointerItem):
         self.table.put_item(Item=item.to_item())
 
-    def _write_object(self, data: bytes, item: PointerItem):
-        s3object = self.bucket.put_object(
-            Body=data, Key=item.partition_key, Metadata=item.context
+    def _write_object(self, data: Union[bytes, BinaryIO], item: PointerItem):
+        # upload_fileobj sends the source in parts as it is read, so a streamed
+        # document never has to be held in memory all at once
+        if isinstance(data, bytes):
+            data = io.BytesIO(data)
+        self.bucket.upload_fileobj(
+            Fileobj=data, Key=item.partition_key, ExtraArgs={"Metadata": item.context}
         )
-        return s3object
 
-    def _get_object(self, item: PointerItem) -> bytes:
-        s3object = self.bucket.Object(item.partition_key).get()
-        return s3object["Body"].read()
+    def _get_object(self, item: PointerItem) -> StreamingBody:
+        # Hand back the body unread so callers can stream it instead of copying it.
+        # retrieve_many calls this from worker threads, so go through the client:
+        # boto3 clients are thread-safe, the resource objects wrapping them are not.
+        s3object = self.bucket.meta.client.get_object(
+            Bucket=self.bucket.name, Key=item.partition_key
+        )
+        return s3object["Body"]
 
     def _populate_key_records(self, pointer: PointerItem) -> Set[ContextItem]:
+        # The batch writer sends up to 25 items per request and retries any that
+        # come back unprocessed
         context_items: Set[ContextItem] = pointer.context_items()
-        for context_item in context_items:
-            self.table.put_item(Item=context_item.to_item())
+        with self.table.batch_writer() as batch:
+            for context_item in context_items:
+                batch.put_item(Item=context_item.to_item())
         return context_items
 
+    def _delete_key_records(self, pointer: PointerItem):
+        with self.table.batch_writer() as batch:
+            for context_item in pointer.context_items():
+                batch.delete_item(Key=context_item.to_item())
+
     def _get_pointer_item(self, pointer_query: PointerQuery) -> PointerItem:
-        pointer_items = self.table.query(
-            KeyConditionExpression=pointer_query.expression()
+        # Also called from retrieve_many's worker threads; see _get_object
+        pointer_items = self.table.meta.client.query(
+            TableName=self.table.name, KeyConditionExpression=pointer_query.expression()
         )["Items"]
         if len(pointer_items) != 1:
             raise ValueError(
@@ -60,22 +149,63 @@ class DocumentBucketOperations:
             )
         return PointerItem.from_item(pointer_items[0])
 
+    @staticmethod
+    def _paginate(operation, **kwargs) -> Iterator[Dict[str, Any]]:
+        # Follow LastEvaluatedKey so results aren't truncated at DynamoDB's 1MB page
+        while True:
+            result = operation(**kwargs)
+            yield from result["Items"]
+            if "LastEvaluatedKey" not in result:
+                return
+            kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+    def _batch_get_items(self, keys: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+        # The table's client carries the resource's type (de)serialization, so keys
+        # and returned items are plain Python values.
+        client = self.table.meta.client
+        for start in range(0, len(keys), _BATCH_GET_LIMIT):
+            end = start + _BATCH_GET_LIMIT
+            request = {self.table.name: {"Keys": keys[start:end]}}
+            retries = 0
+            while request:
+                if retries:
+                    # Unprocessed keys usually mean throttling, so back off (capped
+                    # exponential with full jitter) rather than retrying straight away
+                    delay = _BATCH_GET_BASE_DELAY * 2 ** (retries - 1)
+                    time.sleep(random.uniform(0, min(delay, _BATCH_GET_MAX_DELAY)))
+                result = client.batch_get_item(RequestItems=request)
+                yield from result["Responses"].get(self.table.name, [])
+                request = result.get("UnprocessedKeys")
+                retries += 1
+
     def _query_for_context_key(self, query: ContextQuery) -> Set[PointerItem]:
-        result = self.table.query(KeyConditionExpression=query.expression())
-        pointers: Set[PointerItem] = set()
-        for ddb_context_item in result["Items"]:
+        ddb_context_items = self._paginate(
+            self.table.query, KeyConditionExpression=query.expression()
+        )
+        pointer_keys = []
+        for ddb_context_item in ddb_context_items:
             context_item = ContextItem.from_item(ddb_context_item)
-            pointer_query = PointerQuery.from_context_item(context_item)
-            pointers.add(self._get_pointer_item(pointer_query))
-        return pointers
+            pointer_keys.append(PointerQuery.from_context_item(context_item).key())
+        return self._pointers_from_items(self._batch_get_items(pointer_keys))
 
     def _scan_table(self) -> Set[PointerItem]:
-        result = self.table.scan(FilterExpression=PointerItem.filter_for())
-        pointers = set()
-        for ddb_item in result["Items"]:
-            pointer = PointerItem.from_item(ddb_item)
-            pointers.add(pointer)
-        return pointers
+        ddb_items = self._paginate(
+            self.table.scan, FilterExpression=PointerItem.filter_for()
+        )
+        return self._pointers_from_items(ddb_items)
+
+    @staticmethod
+    def _pointers_from_items(ddb_items: Iterable[Dict[str, Any]]) -> Set[PointerItem]:
+        # Pointers are unique by partition key, so dedupe on the raw key before
+        # paying for a PointerItem (and its hash/eq) per row. Rows come from our own
+        # table, already validated on write, so they skip re-validation.
+        partition_key_name = PointerItem.partition_key_name()
+        pointers: Dict[str, PointerItem] = {}
+        for ddb_item in ddb_items:
+            partition_key = ddb_item[partition_key_name]
+            if partition_key not in pointers:
+                pointers[partition_key] = PointerItem._from_table_item(ddb_item)
+        return set(pointers.values())
 
     def list(self) -> Set[PointerItem]:
         """
@@ -88,8 +218,8 @@ class DocumentBucketOperations:
     def retrieve(
         self,
         pointer_key: str,
-        expected_context_keys: Set[str] = set(),
-        expected_context: Dict[str, str] = {},
+        expected_context_keys: Optional[AbstractSet[str]] = None,
+        expected_context: Optional[Dict[str, str]] = None,
     ) -> DocumentBundle:
         """
         Retrieves a document from the Document Bucket system.
@@ -99,15 +229,55 @@ class DocumentBucketOperations:
         :param expected_context: TODO do something with this parameter :)
         :returns: the document, its key, and associated context
         """
-        item = self._get_pointer_item(PointerQuery.from_key(pointer_key))
-        # ADD-ESDK-COMPLETE: Add Decryption to retrieve
-        encrypted_data = self._get_object(item)
-        plaintext, header = aws_encryption_sdk.decrypt(
-            source=encrypted_data, key_provider=self.master_key_provider
+        pointer_query = PointerQuery.from_key(pointer_key)
+        cache_key = str(pointer_query.partition_key)
+        cached = self._plaintext_cache.get(cache_key)
+        if cached is None:
+            item = self._get_pointer_item(pointer_query)
+            # ADD-ESDK-COMPLETE: Add Decryption to retrieve
+            with closing(self._get_object(item)) as encrypted_data:
+                plaintext, header = aws_encryption_sdk.decrypt(
+                    source=encrypted_data, materials_manager=self.materials_manager
+                )
+            # Keep read-only snapshots and give every caller its own copy, so edits
+            # to a returned context can't change what later retrievals check
+            cached = (
+                MappingProxyType(dict(item.context)),
+                plaintext,
+                MappingProxyType(dict(header.encryption_context)),
+            )
+            self._plaintext_cache.put(cache_key, cached)
+        context, plaintext, encryption_context = cached
+        return DocumentBundle.from_data_and_context(plaintext, dict(context))
+
+    def retrieve_many(
+        self,
+        pointer_keys: Iterable[str],
+        expected_context_keys: Optional[AbstractSet[str]] = None,
+        expected_context: Optional[Dict[str, str]] = None,
+    ) -> List[DocumentBundle]:
+        """
+        Retrieves several documents from the Document Bucket system concurrently.
+
+        :param pointer_keys: the keys for the documents to retrieve
+        :param expected_context_keys: the set of context keys that each document
+                                      should have
+        :param expected_context: the set of context key-value pairs that each document
+                                 should have
+        :returns: the documents, in the same order as the provided keys
+        """
+        retrieve = partial(
+            self.retrieve,
+            expected_context_keys=expected_context_keys,
+            expected_context=expected_context,
         )
-        return DocumentBundle.from_data_and_context(plaintext, item.context)
+        # retrieve never submits to the executor itself, so sharing it with store
+        # can't deadlock, and keeps one bound on the object's concurrent requests
+        return list(self._executor.map(retrieve, pointer_keys))
 
-    def store(self, data: bytes, context: Dict[str, str] = {}) -> PointerItem:
+    def store(
+        self, data: bytes, context: Optional[Dict[str, str]] = None
+    ) -> PointerItem:
         """
         Stores a document in the Document Bucket system.
 
@@ -115,14 +285,28 @@ class DocumentBucketOperations:
         :param context: TODO do something with this parameter :)
         :returns: the pointer reference for this document in the Document Bucket system
         """
-        # ADD-ESDK-COMPLETE: Add Encryption to store
-        encrypted_data, header = aws_encryption_sdk.encrypt(
-            source=data, key_provider=self.master_key_provider,
-        )
+        if context is None:
+            context = {}
         item = PointerItem.generate(context)
+        # Context keys only lead searches to the pointer, which is written last, so
+        # they can go in while the document uploads
+        key_records = self._executor.submit(self._populate_key_records, item)
+        try:
+            # ADD-ESDK-COMPLETE: Add Encryption to store
+            with aws_encryption_sdk.stream(
+                mode="e",
+                source=data,
+                source_length=len(data),
+                materials_manager=self.materials_manager,
+            ) as encrypted_data:
+                self._write_object(encrypted_data, item)
+        except Exception:
+            # Don't leave context keys behind for a document that was never written
+            key_records.exception()
+            self._delete_key_records(item)
+            raise
+        key_records.result()
         self._write_pointer(item)
-        self._write_object(encrypted_data, item)
-        self._populate_key_records(item)
         return item
 
     def search_by_context_key(self, context_key: str) -> Set[PointerItem]:
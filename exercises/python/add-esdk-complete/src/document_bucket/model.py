@@ -3,16 +3,69 @@
 
 from __future__ import annotations
 
-import copy
+import re
+import sys
 import uuid
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from typing import Dict, Optional, Set, Union
 from uuid import UUID
 
-from boto3.dynamodb.conditions import Key  # type: ignore
+from boto3.dynamodb.conditions import ConditionBase, Key  # type: ignore
 
 from .config import config
 
+# Table layout is fixed for the life of the process, so resolve it once rather than
+# on every item constructed.
+_TABLE_CONFIG = config["document_bucket"]["document_table"]
+# Interned so that item keys built from them share one string object.
+_PK_NAME: str = sys.intern(_TABLE_CONFIG["partition_key"])
+_SK_NAME: str = sys.intern(_TABLE_CONFIG["sort_key"])
+_CTX_PREFIX: str = sys.intern(_TABLE_CONFIG["ctx_prefix"].upper())
+_OBJECT_TARGET: str = sys.intern(_TABLE_CONFIG["object_target"])
+
+#: Key conditions are immutable, so build the ones every query needs just once.
+_PARTITION_KEY = Key(_PK_NAME)
+_POINTER_FILTER = Key(_SK_NAME).eq(_OBJECT_TARGET)
+
+#: The canonical (lower case, hyphenated) form that str(UUID) produces.
+_CANONICAL_UUID = re.compile(
+    r"\A[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\Z"
+)
+
+
+def _uuid_str(key: Union[UUIDKey, UUID, str]) -> str:
+    # Keys we wrote ourselves are already canonical, so a regex match is enough to
+    # validate them. Any other string is parsed once, which validates it and
+    # normalizes the other spellings UUID accepts. UUIDs and UUIDKeys are already
+    # valid and only need to be rendered.
+    if isinstance(key, str):
+        return key if _CANONICAL_UUID.match(key) else str(UUID(key))
+    return str(key)
+
+
+def _slotted(cls):
+    """
+    Rebuild a dataclass with __slots__ for its own fields, as dataclass(slots=True)
+    does on Python 3.10+, so that instances carry no per-instance __dict__.
+    """
+    inherited = {n for base in cls.__mro__[1:] for n in getattr(base, "__slots__", ())}
+    namespace = dict(cls.__dict__)
+    for f in fields(cls):
+        # Defaults already live in the generated __init__ and would shadow the slots
+        namespace.pop(f.name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    own = tuple(f.name for f in fields(cls) if f.name not in inherited)
+    namespace["__slots__"] = own
+    slotted = type(cls)(cls.__name__, cls.__bases__, namespace)
+    # Zero-argument super() closes over the original class; point it at the new one
+    for value in namespace.values():
+        function = getattr(value, "__func__", value)
+        for cell in getattr(function, "__closure__", None) or ():
+            if cell.cell_contents is cls:
+                cell.cell_contents = slotted
+    return slotted
+
 
 class DataModelException(Exception):
     """
@@ -22,6 +75,7 @@ class DataModelException(Exception):
     pass
 
 
+@_slotted
 @dataclass
 class UUIDKey:
     """
@@ -35,12 +89,13 @@ class UUIDKey:
     def __post_init__(self):
         if isinstance(self.key, str):
             # Validate that the UUID is well formed before continuing.
-            self.key = str(UUID(self.key))
+            self.key = _uuid_str(self.key)
 
     def __str__(self):
         return str(self.key)
 
 
+@_slotted
 @dataclass
 class BaseItem:
     """
@@ -67,14 +122,14 @@ class BaseItem:
         """
         :returns: the name of the item attribute used as the partition key.
         """
-        return config["document_bucket"]["document_table"]["partition_key"]
+        return _PK_NAME
 
     @classmethod
     def sort_key_name(cls) -> str:
         """
         :returns: the name of the item attribute used as the sort key.
         """
-        return config["document_bucket"]["document_table"]["sort_key"]
+        return _SK_NAME
 
     def _assert_set(self):
         if self.partition_key is None:
@@ -89,12 +144,13 @@ class BaseItem:
         :returns: a dict ready to write to DynamoDB
         """
         key = {
-            BaseItem.partition_key_name(): self.partition_key,
-            BaseItem.sort_key_name(): self.sort_key,
+            _PK_NAME: self.partition_key,
+            _SK_NAME: self.sort_key,
         }
         return key
 
 
+@_slotted
 @dataclass
 class ContextQuery:
     """
@@ -102,19 +158,22 @@ class ContextQuery:
     """
 
     partition_key: str
+    _expression: ConditionBase = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
         self.partition_key = ContextItem.canonicalize(self.partition_key)
+        self._expression = _PARTITION_KEY.eq(self.partition_key)
 
-    def expression(self) -> Dict[str, str]:
+    def expression(self) -> ConditionBase:
         """
         Generate a query expression for this context query.
 
         :returns: DynamoDB key expression ready for querying
         """
-        return Key(BaseItem.partition_key_name()).eq(self.partition_key)
+        return self._expression
 
 
+@_slotted
 @dataclass
 class PointerQuery:
     """
@@ -129,7 +188,7 @@ class PointerQuery:
         :param pointer_key: the pointer key to query for
         :returns: a PointerQuery for the provided key
         """
-        return PointerQuery(str(UUIDKey(pointer_key)))
+        return PointerQuery(_uuid_str(pointer_key))
 
     @staticmethod
     def from_context_item(context_item) -> PointerQuery:
@@ -141,15 +200,27 @@ class PointerQuery:
         """
         return PointerQuery(context_item.sort_key)
 
-    def expression(self) -> Dict[str, str]:
+    def expression(self) -> ConditionBase:
         """
         Generate a query expression for this PointerQuery.
 
         :returns: DynamoDB key expression ready for querying
         """
-        return Key(BaseItem.partition_key_name()).eq(self.partition_key)
+        return _PARTITION_KEY.eq(self.partition_key)
+
+    def key(self) -> Dict[str, str]:
+        """
+        Generate the full primary key of the PointerItem this query refers to.
 
+        :returns: DynamoDB key ready for GetItem or BatchGetItem
+        """
+        return {
+            _PK_NAME: str(self.partition_key),
+            _SK_NAME: _OBJECT_TARGET,
+        }
 
+
+@_slotted
 @dataclass
 class ContextItem(BaseItem):
     def __hash__(self):
@@ -160,7 +231,7 @@ class ContextItem(BaseItem):
 
     @classmethod
     def _prefix(cls) -> str:
-        return config["document_bucket"]["document_table"]["ctx_prefix"].upper()
+        return _CTX_PREFIX
 
     @classmethod
     def canonicalize(cls, context_key: str) -> str:
@@ -171,14 +242,29 @@ class ContextItem(BaseItem):
         :param context_key: the key to canonicalize
         :returns: the context_key updated to canonical form, if required
         """
-        if not context_key.startswith(ContextItem._prefix()):
-            context_key = ContextItem._prefix() + context_key
+        if not context_key.startswith(_CTX_PREFIX):
+            context_key = _CTX_PREFIX + context_key
         return context_key
 
+    @classmethod
+    def _from_validated(cls, partition_key: str, sort_key: str) -> ContextItem:
+        """
+        Build a ContextItem from keys that are already in canonical form, skipping
+        the checks in __post_init__.
+
+        :param partition_key: the canonical (prefixed) context key
+        :param sort_key: the canonical string form of a PointerItem's UUID
+        :returns: the modeled ContextItem
+        """
+        item = cls.__new__(cls)
+        item.partition_key = partition_key
+        item.sort_key = sort_key
+        return item
+
     def __post_init__(self):
         self._assert_set()
         self.partition_key = ContextItem.canonicalize(self.partition_key)
-        self.sort_key = str(UUID(self.sort_key))
+        self.sort_key = _uuid_str(self.sort_key)
 
     @classmethod
     def from_item(cls, item: Dict[str, str]) -> ContextItem:
@@ -188,15 +274,14 @@ class ContextItem(BaseItem):
         :param item: the item to map
         :returns: the modeled ContextItem
         """
-        partition_key = item.pop(BaseItem.partition_key_name())
-        sort_key = item.pop(BaseItem.sort_key_name())
-        return cls(partition_key, sort_key)
+        return cls(item[_PK_NAME], item[_SK_NAME])
 
 
+@_slotted
 @dataclass
 class PointerItem(BaseItem):
     #: PointerItems have a fixed sort key
-    sort_key: str = config["document_bucket"]["document_table"]["object_target"]
+    sort_key: str = _OBJECT_TARGET
     #: The context for the document that this PointerItem refers to
     context: Dict[str, str] = field(default_factory=dict)
 
@@ -209,7 +294,7 @@ class PointerItem(BaseItem):
 
     @classmethod
     def _sort_key_config(cls) -> str:
-        return config["document_bucket"]["document_table"]["object_target"]
+        return _OBJECT_TARGET
 
     @classmethod
     def _generate_key(cls) -> UUIDKey:
@@ -236,29 +321,24 @@ class PointerItem(BaseItem):
         :param context: the context for this document
         :returns: a modeled PointerItem
         """
-        if not isinstance(key, UUIDKey):
-            key = UUIDKey(key)
-        return cls(partition_key=key, context=context)
+        return cls(partition_key=_uuid_str(key), context=context)
 
     @staticmethod
     def _validate_reserved_ec_keys(context: Dict[str, str]):
-        pkn = BaseItem.partition_key_name()
-        skn = BaseItem.sort_key_name()
-        if pkn in context.keys() or skn in context.keys():
+        if _PK_NAME in context or _SK_NAME in context:
             raise DataModelException(
-                f"Can't use DB key names ({pkn}, {skn}) as Encryption Context keys!"
+                f"Can't use DB key names ({_PK_NAME}, {_SK_NAME}) as Encryption "
+                "Context keys!"
             )
 
     def __post_init__(self):
         self._assert_set()
-        if not isinstance(self.partition_key, UUIDKey):
-            self.partition_key = UUIDKey(self.partition_key)
+        self.partition_key = _uuid_str(self.partition_key)
         PointerItem._validate_reserved_ec_keys(self.context)
-        if self.sort_key != self._sort_key_config():
+        if self.sort_key != _OBJECT_TARGET:
             raise DataModelException(
-                f"Sort key should be {self._sort_key_config()}, was {self.sort_key}"
+                f"Sort key should be {_OBJECT_TARGET}, was {self.sort_key}"
             )
-        self.partition_key = str(self.partition_key)
 
     def context_items(self) -> Set[ContextItem]:
         """
@@ -266,10 +346,12 @@ class PointerItem(BaseItem):
 
         :returns: a ContextItem for each key of context for this PointerItem
         """
-        result: Set[ContextItem] = set()
-        for context_key in self.context.keys():
-            result.add(ContextItem(context_key, self.partition_key))
-        return result
+        # Our partition key was validated and canonicalized to a str in __post_init__
+        sort_key = str(self.partition_key)
+        return {
+            ContextItem._from_validated(ContextItem.canonicalize(k), sort_key)
+            for k in self.context
+        }
 
     @classmethod
     def filter_for(cls):
@@ -278,12 +360,19 @@ class PointerItem(BaseItem):
 
         :returns: a key expression filter ready to use with DynamoDB operations
         """
-        return Key(BaseItem.sort_key_name()).eq(cls.sort_key)
+        return _POINTER_FILTER
 
     def to_item(self):
-        item = super().to_item()
-        item = {**item, **copy.deepcopy(self.context)}
-        return item
+        # Context values are strings, so a shallow copy is all the isolation needed
+        return {**super().to_item(), **self.context}
+
+    @staticmethod
+    def _context_from_item(item: Dict[str, str]) -> Dict[str, str]:
+        # The same few context keys repeat on every record, so intern them to share
+        # one string per key across all the pointers in a large listing.
+        return {
+            sys.intern(k): v for k, v in item.items() if k != _PK_NAME and k != _SK_NAME
+        }
 
     @staticmethod
     def from_item(item: Dict[str, str]) -> PointerItem:
@@ -293,11 +382,42 @@ class PointerItem(BaseItem):
         :param item: the item to map
         :returns: the modeled PointerItem
         """
-        partition_key = item.pop(BaseItem.partition_key_name())
-        sort_key = item.pop(BaseItem.sort_key_name())
-        return PointerItem(partition_key, sort_key, item)
+        context = PointerItem._context_from_item(item)
+        return PointerItem(item[_PK_NAME], item[_SK_NAME], context)
+
+    @classmethod
+    def _from_validated(
+        cls, partition_key: str, context: Dict[str, str]
+    ) -> PointerItem:
+        """
+        Build a PointerItem from a key that is already in canonical form and a context
+        that has already been checked, skipping the checks in __post_init__.
+
+        :param partition_key: the canonical string form of the document's UUID
+        :param context: the context for the document
+        :returns: the modeled PointerItem
+        """
+        item = cls.__new__(cls)
+        item.partition_key = partition_key
+        item.sort_key = _OBJECT_TARGET
+        item.context = context
+        return item
+
+    @staticmethod
+    def _from_table_item(item: Dict[str, str]) -> PointerItem:
+        """
+        Map a pointer record read back from the Document Bucket table into a
+        PointerItem. Records were validated when they were stored, so they are not
+        checked again here; use from_item for anything else.
+
+        :param item: the pointer record to map
+        :returns: the modeled PointerItem
+        """
+        context = PointerItem._context_from_item(item)
+        return PointerItem._from_validated(item[_PK_NAME], context)
 
 
+@_slotted
 @dataclass
 class DocumentBundle:
     """
@@ -9,6 +9,7 @@ import toml
 
 from .api import DocumentBucketOperations
 from .config import config
+from .ddb import dynamodb_resource
 
 
 def initialize() -> DocumentBucketOperations:
@@ -23,7 +24,7 @@ def initialize() -> DocumentBucketOperations:
     # Set up your S3 Bucket for the Document Bucket
     bucket = boto3.resource("s3").Bucket(state["DocumentBucket"])
     # Set up your DynamoDB Table for the Document Bucket
-    table = boto3.resource("dynamodb").Table(state["DocumentTable"])
+    table = dynamodb_resource().Table(state["DocumentTable"])
 
     # ADD-ESDK-START
     # Set up the API to interact with the Document Bucket using all these resources
@@ -4,15 +4,18 @@
 import io
 import random
 import string
+import threading
+import time
 from unittest import mock
 from unittest.mock import call
 
 import aws_encryption_sdk
 import pytest
 from aws_encryption_sdk import KMSMasterKeyProvider  # type: ignore
-from document_bucket.api import DocumentBucketOperations
+from document_bucket import api
+from document_bucket.api import _MAX_CONCURRENCY, DocumentBucketOperations
 from document_bucket.model import (BaseItem, ContextItem, ContextQuery,
-                                   PointerItem)
+                                   PointerItem, PointerQuery)
 
 
 def standard_context():
@@ -106,24 +109,89 @@ def test_write_pointer_happy_case(mocked_dbo, pointer_item):
 def test_write_object_happy_case(mocked_dbo, pointer_item):
     data = bytes.fromhex("cafebabe")
     mocked_dbo._write_object(data, pointer_item)
-    mocked_dbo.bucket.put_object.assert_called_with(
-        Body=data, Key=pointer_item.partition_key, Metadata=pointer_item.context
+    _, kwargs = mocked_dbo.bucket.upload_fileobj.call_args
+    assert kwargs["Fileobj"].read() == data
+    assert kwargs["Key"] == pointer_item.partition_key
+    assert kwargs["ExtraArgs"] == {"Metadata": pointer_item.context}
+
+
+def test_write_object_streams(mocked_dbo, pointer_item):
+    stream = io.BytesIO(bytes.fromhex("cafebabe"))
+    mocked_dbo._write_object(stream, pointer_item)
+    mocked_dbo.bucket.upload_fileobj.assert_called_with(
+        Fileobj=stream,
+        Key=pointer_item.partition_key,
+        ExtraArgs={"Metadata": pointer_item.context},
     )
 
 
+@pytest.fixture
+def stub_encryption(monkeypatch):
+    # Lets the store tests run whichever way store calls the Encryption SDK
+    encrypted = (bytes.fromhex("decafbad"), mock.Mock())
+    mock_encrypt = mock.Mock(return_value=encrypted)
+    monkeypatch.setattr(aws_encryption_sdk, "encrypt", mock_encrypt)
+    monkeypatch.setattr(aws_encryption_sdk, "stream", mock.MagicMock())
+
+
+def test_store_writes_pointer_last(stub_encryption, mocked_dbo):
+    calls = mock.Mock()
+    mocked_dbo._write_object = calls.write_object
+    mocked_dbo._populate_key_records = calls.populate_key_records
+    mocked_dbo._write_pointer = calls.write_pointer
+    item = mocked_dbo.store(b"plaintext", standard_context())
+    calls.populate_key_records.assert_called_once_with(item)
+    calls.write_pointer.assert_called_once_with(item)
+    names = [name for name, _, _ in calls.mock_calls]
+    assert names[-1] == "write_pointer"
+    assert "write_object" in names
+
+
+def test_store_failed_upload_removes_key_records(stub_encryption, mocked_dbo):
+    mocked_dbo._write_object = mock.Mock(side_effect=RuntimeError("upload failed"))
+    mocked_dbo._write_pointer = mock.Mock()
+    with pytest.raises(RuntimeError):
+        mocked_dbo.store(b"plaintext", standard_context())
+    mocked_dbo._write_pointer.assert_not_called()
+    (_, item), _ = mocked_dbo._write_object.call_args
+    calls = [call(Key=c.to_item()) for c in item.context_items()]
+    batch = mocked_dbo.table.batch_writer.return_value.__enter__.return_value
+    batch.delete_item.assert_has_calls(calls, any_order=True)
+    assert batch.delete_item.call_count == len(calls)
+
+
+def test_store_and_retrieve_many_reuse_executor(monkeypatch, stub_encryption):
+    mock_executor = mock.Mock()
+    mock_executor.return_value.map.return_value = iter([])
+    monkeypatch.setattr(api, "ThreadPoolExecutor", mock_executor)
+    mkp = mock.Mock(spec=KMSMasterKeyProvider)
+    ops = DocumentBucketOperations(mock.MagicMock(), mock.MagicMock(), mkp)
+    ops.store(b"plaintext", standard_context())
+    ops.store(b"plaintext", standard_context())
+    ops.retrieve_many([get_pointer_key()])
+    mock_executor.assert_called_once_with(max_workers=_MAX_CONCURRENCY)
+    assert mock_executor.return_value.submit.call_count == 2
+    mock_executor.return_value.map.assert_called_once()
+
+
+def test_store_default_context_not_shared(stub_encryption, mocked_dbo):
+    first = mocked_dbo.store(b"plaintext")
+    first.context["leaked"] = "value"
+    assert mocked_dbo.store(b"plaintext").context == {}
+
+
 def test_get_object_happy_case(mocked_dbo, pointer_item):
     # Mock out the interaction with S3 -- set up something with expected bytes
     data = io.BytesIO(bytes.fromhex("decafbad"))
 
-    class MockedObject(mock.MagicMock):
-        def get(self):
-            return {"Body": data}
-
-    # Actually return the mock object from the "S3 call"
-    mocked_dbo.bucket.Object = MockedObject
-    # Now see if our method actually returned the data
-    actual_bytes = mocked_dbo._get_object(pointer_item)
-    assert actual_bytes == data.getvalue()
+    mocked_dbo.bucket.meta.client.get_object.return_value = {"Body": data}
+    # Now see if our method handed back the (unread) body with the data
+    actual_body = mocked_dbo._get_object(pointer_item)
+    mocked_dbo.bucket.meta.client.get_object.assert_called_once_with(
+        Bucket=mocked_dbo.bucket.name, Key=pointer_item.partition_key
+    )
+    assert actual_body is data
+    assert actual_body.read() == bytes.fromhex("decafbad")
 
 
 def test_populate_keys_happy_case(mocked_dbo, pointer_item):
@@ -132,16 +200,17 @@ def test_populate_keys_happy_case(mocked_dbo, pointer_item):
     for key in pointer_item.context.keys():
         ctx_key = ContextItem(key, pointer_item.partition_key)
         calls.append(call(Item=ctx_key.to_item()))
-    mocked_dbo.table.put_item.assert_has_calls(calls, any_order=True)
+    batch = mocked_dbo.table.batch_writer.return_value.__enter__.return_value
+    batch.put_item.assert_has_calls(calls, any_order=True)
+    mocked_dbo.table.put_item.assert_not_called()
 
 
 def test_query_for_context_key(mocked_dbo, random_context_key_ddb_result):
     # There is some trickery for mocking out DDB here.
     # First there's a query for a specific context key, which will return a hash-and-
     # range of one unique context key and many UUIDs (sort keys). For the conceit
-    # of the test, assume two queries are made in order: one to get a context key with
-    # one matching item; and one to lookup that item and its context to map to a
-    # pointer. This is a bit incomplete and contrived, but simulating DDB gets
+    # of the test, assume the pointers for those UUIDs are then fetched with a single
+    # batch get. This is a bit incomplete and contrived, but simulating DDB gets
     # complex fast and this is better covered by DDBLocal (integration).
 
     # Pull out the context key target from the 'results'
@@ -153,32 +222,92 @@ def test_query_for_context_key(mocked_dbo, random_context_key_ddb_result):
         partition_key=test_context_target, context=random_context(8)
     )
     # Create a fake pointer lookup result to return for the chosen guid
-    test_pointer_result = {"Items": [test_pointer.to_item()]}
+    mocked_dbo.table.name = "DocumentTable"
+    test_pointer_result = {"Responses": {"DocumentTable": [test_pointer.to_item()]}}
+    batch_get_item = mocked_dbo.table.meta.client.batch_get_item
+    batch_get_item.return_value = test_pointer_result
     # Set up query objects
     q = ContextQuery(test_context_target)
     # Set up returning the fake DDB Item when we call query
-    mock_query = mock.Mock()
-    # Return first the "fake table", then the "fake pointer lookup result"
-    mock_query.side_effect = [random_context_key_ddb_result, test_pointer_result]
-    mocked_dbo.table.query = mock_query
+    mocked_dbo.table.query = mock.Mock(return_value=random_context_key_ddb_result)
     # Query
     pointers = mocked_dbo._query_for_context_key(q)
-    # Assert we got back a matching Pointer record
+    # Assert we got back a matching Pointer record, with no per-pointer lookups
     assert test_pointer in pointers
+    mocked_dbo.table.query.assert_called_once()
+    batch_get_item.assert_called_once_with(
+        RequestItems={
+            "DocumentTable": {"Keys": [PointerQuery(test_pointer.partition_key).key()]}
+        }
+    )
+
+
+def test_query_for_context_key_retries_unprocessed(mocked_dbo):
+    pointers = [random_pointer_item() for _ in range(150)]
+    context_items = [ContextItem("fleet", p.partition_key) for p in pointers]
+    mocked_dbo.table.query = mock.Mock(
+        return_value={"Items": [c.to_item() for c in context_items]}
+    )
+    mocked_dbo.table.name = "DocumentTable"
+    unprocessed = {
+        "DocumentTable": {"Keys": [PointerQuery(pointers[0].partition_key).key()]}
+    }
+    responses = [
+        {
+            "Responses": {"DocumentTable": [p.to_item() for p in pointers[1:100]]},
+            "UnprocessedKeys": unprocessed,
+        },
+        {"Responses": {"DocumentTable": [pointers[0].to_item()]}},
+        {"Responses": {"DocumentTable": [p.to_item() for p in pointers[100:]]}},
+    ]
+    batch_get_item = mocked_dbo.table.meta.client.batch_get_item
+    batch_get_item.side_effect = responses
+    assert mocked_dbo._query_for_context_key(ContextQuery("fleet")) == set(pointers)
+    assert batch_get_item.call_count == 3
+    batch_get_item.assert_any_call(RequestItems=unprocessed)
+
+
+def test_query_for_context_key_backs_off_between_retries(monkeypatch, mocked_dbo):
+    pointers = [random_pointer_item() for _ in range(3)]
+    context_items = [ContextItem("fleet", p.partition_key) for p in pointers]
+    mocked_dbo.table.query = mock.Mock(
+        return_value={"Items": [c.to_item() for c in context_items]}
+    )
+    mocked_dbo.table.name = "DocumentTable"
+
+    def response(done, pending):
+        result = {"Responses": {"DocumentTable": [p.to_item() for p in done]}}
+        if pending:
+            keys = [PointerQuery(p.partition_key).key() for p in pending]
+            result["UnprocessedKeys"] = {"DocumentTable": {"Keys": keys}}
+        return result
+
+    batch_get_item = mocked_dbo.table.meta.client.batch_get_item
+    batch_get_item.side_effect = [
+        response(pointers[:1], pointers[1:]),
+        response([], pointers[1:]),
+        response(pointers[1:], []),
+    ]
+    sleeps = []
+    monkeypatch.setattr(api.time, "sleep", sleeps.append)
+    # Always pick the top of the jitter range so the caps are observable
+    monkeypatch.setattr(api.random, "uniform", lambda low, high: high)
+    assert mocked_dbo._query_for_context_key(ContextQuery("fleet")) == set(pointers)
+    assert batch_get_item.call_count == 3
+    assert sleeps == [api._BATCH_GET_BASE_DELAY, 2 * api._BATCH_GET_BASE_DELAY]
 
 
-def test_non_unique_pointer_throws(mocked_dbo, random_context_key_ddb_result):
+def test_non_unique_pointer_throws(mocked_dbo):
     # If somehow there were two entries returned on a query for a given pointer UUID
     # (i.e. something has gone wrong with enforcement of the data model), make sure
-    # query throws.
+    # the lookup throws.
     bogus_result = {
         "Items": [random_pointer_item().to_item(), random_pointer_item().to_item()]
     }
-    mock_query = mock.Mock()
-    mock_query.side_effect = [random_context_key_ddb_result, bogus_result]
-    mocked_dbo.table.query = mock_query
+    mocked_dbo.table.meta.client.query = mock.Mock(return_value=bogus_result)
     with pytest.raises(ValueError):
-        mocked_dbo._query_for_context_key(ContextQuery("foobar"))
+        mocked_dbo._get_pointer_item(PointerQuery.from_key(get_pointer_key()))
+    mocked_dbo.table.query.assert_not_called()
 
 
 def test_list_items(mocked_dbo, random_ddb_pointer_table):
@@ -198,6 +327,37 @@ def test_list_items(mocked_dbo, random_ddb_pointer_table):
     assert expected_guids == actual_guids
 
 
+def test_list_items_follows_pages(mocked_dbo):
+    first = random_pointer_item()
+    second = random_pointer_item()
+    last_key = {BaseItem.partition_key_name(): first.partition_key}
+    pages = [
+        {"Items": [first.to_item()], "LastEvaluatedKey": last_key},
+        {"Items": [second.to_item()]},
+    ]
+    mocked_dbo.table.scan = mock.Mock(side_effect=pages)
+    pointers = mocked_dbo.list()
+    assert pointers == {first, second}
+    assert mocked_dbo.table.scan.call_count == 2
+    _, kwargs = mocked_dbo.table.scan.call_args
+    assert kwargs["ExclusiveStartKey"] == last_key
+
+
+def test_list_items_filters_server_side(mocked_dbo):
+    mocked_dbo.table.scan = mock.Mock(return_value={"Items": []})
+    mocked_dbo.list()
+    mocked_dbo.table.scan.assert_called_once_with(
+        FilterExpression=PointerItem.filter_for()
+    )
+
+
+def test_list_items_dedupes_pointers(mocked_dbo):
+    pointer = random_pointer_item()
+    page = {"Items": [pointer.to_item(), pointer.to_item()]}
+    mocked_dbo.table.scan = mock.Mock(return_value=page)
+    assert mocked_dbo.list() == {pointer}
+
+
 def test_context_key(mocked_dbo):
     key = random_key_or_value()
     query = ContextQuery(key)
@@ -205,6 +365,69 @@ def test_context_key(mocked_dbo):
     mocked_dbo.table.query.assert_called_with(KeyConditionExpression=query.expression())
 
 
+def test_retrieve_many_preserves_order(mocked_dbo):
+    keys = [get_pointer_key() for _ in range(32)]
+
+    def mock_retrieve(key, **kwargs):
+        return key
+
+    mocked_dbo.retrieve = mock.Mock(side_effect=mock_retrieve)
+    assert mocked_dbo.retrieve_many(keys) == keys
+    assert mocked_dbo.retrieve.call_count == len(keys)
+
+
+def test_retrieve_many_bounds_concurrency(monkeypatch, mocked_dbo):
+    # The bound comes from the object's shared executor, not a per-call one
+    monkeypatch.setattr(api, "ThreadPoolExecutor", None)
+    keys = [get_pointer_key() for _ in range(4 * _MAX_CONCURRENCY)]
+    lock = threading.Lock()
+    in_flight = []
+    peak = 0
+
+    def mock_retrieve(key, **kwargs):
+        nonlocal peak
+        with lock:
+            in_flight.append(key)
+            peak = max(peak, len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.remove(key)
+        return key
+
+    mocked_dbo.retrieve = mock.Mock(side_effect=mock_retrieve)
+    assert mocked_dbo.retrieve_many(keys) == keys
+    assert 1 < peak <= _MAX_CONCURRENCY
+
+
+def test_retrieve_many_raises_retrieve_errors(mocked_dbo):
+    keys = [get_pointer_key() for _ in range(8)]
+
+    def mock_retrieve(key, **kwargs):
+        if key == keys[3]:
+            raise AssertionError("Encryption context assertion failed!")
+        return key
+
+    mocked_dbo.retrieve = mock.Mock(side_effect=mock_retrieve)
+    with pytest.raises(AssertionError):
+        mocked_dbo.retrieve_many(keys)
+
+
+def test_retrieve_closes_object_body(monkeypatch, mocked_dbo):
+    body = mock.MagicMock()
+    body.read.return_value = b"decafbad"
+    mocked_dbo._get_object = mock.Mock(return_value=body)
+    mocked_dbo._get_pointer_item = mock.MagicMock()
+
+    # Passes the body through, so this holds before and after decryption is added
+    def mock_decrypt(source, **kwargs):
+        assert not source.close.called
+        return source.read(), mock.MagicMock()
+
+    monkeypatch.setattr(aws_encryption_sdk, "decrypt", mock_decrypt)
+    assert mocked_dbo.retrieve(get_pointer_key()).data == b"decafbad"
+    body.close.assert_called_once_with()
+
+
 def test_ec_keys_happy_case(monkeypatch, mocked_dbo):
     key = get_pointer_key()
     expected_keys = standard_context().keys()
@@ -0,0 +1,96 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+from decimal import Decimal
+
+import boto3
+import botocore.session
+import pytest
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import Binary
+from botocore.awsrequest import AWSResponse
+from document_bucket import ddb
+from document_bucket.ddb import dynamodb_resource
+
+CLIENT_ARGS = {
+    "region_name": "us-east-2",
+    "aws_access_key_id": "AKIDEXAMPLE",
+    "aws_secret_access_key": "wJalrXUtnFEMI",
+}
+
+WIRE_ITEM = {
+    "reference": {"S": "b8f1d0d2-86a0-4a6c-9a0c-6a1a9f0e9c11"},
+    "target": {"S": "S3Object"},
+    "count": {"N": "42"},
+    "blob": {"B": "3sr7rQ=="},
+    "nested": {"M": {"list": {"L": [{"S": "bananas"}, {"BOOL": True}]}}},
+}
+
+
+class RawBody:
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+    def stream(self, **kwargs):
+        yield self.payload
+
+
+def table_returning(resource, response):
+    table = resource.Table("DocumentTable")
+
+    def send(request, **kwargs):
+        body = RawBody(json.dumps(response).encode())
+        return AWSResponse(request.url, 200, {"x-amzn-requestid": "test"}, body)
+
+    table.meta.client.meta.events.register("before-send", send)
+    return table
+
+
+@pytest.fixture
+def response():
+    return {
+        "Items": [WIRE_ITEM],
+        "Count": 1,
+        "ScannedCount": 1,
+        "LastEvaluatedKey": {"reference": WIRE_ITEM["reference"]},
+    }
+
+
+def test_items_parsed_to_python_types(response):
+    table = table_returning(dynamodb_resource(**CLIENT_ARGS), response)
+    result = table.query(KeyConditionExpression=Key("reference").eq("foo"))
+    assert result["Items"] == [
+        {
+            "reference": "b8f1d0d2-86a0-4a6c-9a0c-6a1a9f0e9c11",
+            "target": "S3Object",
+            "count": Decimal(42),
+            "blob": Binary(bytes.fromhex("decafbad")),
+            "nested": {"list": ["bananas", True]},
+        }
+    ]
+    assert result["LastEvaluatedKey"] == {
+        "reference": "b8f1d0d2-86a0-4a6c-9a0c-6a1a9f0e9c11"
+    }
+
+
+def test_matches_stock_resource(response):
+    fast = table_returning(dynamodb_resource(**CLIENT_ARGS), response)
+    stock = table_returning(boto3.resource("dynamodb", **CLIENT_ARGS), response)
+    assert fast.scan() == stock.scan()
+
+
+def test_parses_without_orjson(monkeypatch, response):
+    monkeypatch.setattr(ddb, "orjson", None)
+    fast = table_returning(dynamodb_resource(**CLIENT_ARGS), response)
+    stock = table_returning(boto3.resource("dynamodb", **CLIENT_ARGS), response)
+    assert fast.scan() == stock.scan()
+
+
+def test_loader_keeps_data_path(monkeypatch, tmp_path, response):
+    monkeypatch.setenv("AWS_DATA_PATH", str(tmp_path))
+    loader = ddb._attribute_map_loader(botocore.session.get_session())
+    assert str(tmp_path) in loader.search_paths
+    # The bundled models are still found alongside the extra path
+    table = table_returning(dynamodb_resource(**CLIENT_ARGS), response)
+    assert table.scan()["Items"][0]["target"] == "S3Object"
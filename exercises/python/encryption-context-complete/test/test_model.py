@@ -8,7 +8,7 @@ import pytest
 from document_bucket.config import config
 from document_bucket.model import (BaseItem, ContextItem, ContextQuery,
                                    DataModelException, DocumentBundle,
-                                   PointerItem)
+                                   PointerItem, UUIDKey)
 
 
 @pytest.fixture
@@ -53,6 +53,25 @@ def test_invalid_uuid_throws():
         PointerItem("garbage")
 
 
+def test_pointer_item_key_forms(suuid):
+    assert PointerItem(suuid.upper()).partition_key == suuid
+    assert PointerItem(uuid.UUID(suuid)).partition_key == suuid
+    assert PointerItem(UUIDKey(suuid)).partition_key == suuid
+
+
+def test_non_canonical_uuid_spellings(suuid):
+    for spelling in (suuid.replace("-", ""), "{" + suuid + "}", "urn:uuid:" + suuid):
+        assert PointerItem(spelling).partition_key == suuid
+        assert UUIDKey(spelling).key == suuid
+    with pytest.raises(ValueError):
+        PointerItem(suuid[:-1] + "g")
+
+
+def test_context_item_key_forms(suuid):
+    assert ContextItem("fleet", suuid.upper()).sort_key == suuid
+    assert ContextItem("fleet", uuid.UUID(suuid)).sort_key == suuid
+
+
 def test_context_item_happy_case(suuid):
     context_key = "FLEET"
     test_item = ContextItem(context_key, suuid)
@@ -102,11 +121,80 @@ def test_pointer_item(sample_context):
     assert bundle.key.partition_key in item.values()
 
 
+def test_pointer_item_round_trip(sample_context):
+    pointer = PointerItem.generate(sample_context)
+    item = pointer.to_item()
+    snapshot = dict(item)
+    assert PointerItem.from_item(item) == pointer
+    assert PointerItem.from_item(item).context == sample_context
+    assert item == snapshot
+
+
+def test_context_items(sample_context):
+    pointer = PointerItem.generate(sample_context)
+    assert pointer.context_items() == {
+        ContextItem(k, pointer.partition_key) for k in sample_context
+    }
+
+
+def test_items_are_slotted(suuid, sample_context):
+    pointer = PointerItem.generate(sample_context)
+    instances = [
+        pointer,
+        ContextItem("fleet", suuid),
+        ContextQuery("fleet"),
+        DocumentBundle.from_pointer_and_data(pointer, b"data"),
+    ]
+    for instance in instances:
+        assert not hasattr(instance, "__dict__")
+    assert pointer.sort_key == PointerItem(suuid).sort_key
+    assert hash(pointer) == hash(PointerItem(pointer.partition_key))
+
+
+def test_from_item_interns_context_keys(suuid):
+    def raw_item():
+        # Build the key at runtime, as a response parser would, so it isn't interned
+        key = "".join(["fl", "eet"])
+        return {**PointerItem(suuid).to_item(), key: "coolbeans"}
+
+    first = PointerItem.from_item(raw_item())
+    second = PointerItem.from_item(raw_item())
+    assert list(first.context)[0] is list(second.context)[0]
+
+
+def test_from_table_item_matches_from_item(sample_context):
+    record = PointerItem.generate(sample_context).to_item()
+    checked = PointerItem.from_item(record)
+    trusted = PointerItem._from_table_item(record)
+    assert trusted == checked
+    assert trusted.context == checked.context
+    assert hash(trusted) == hash(checked)
+
+
+def test_context_item_from_item_leaves_item(suuid):
+    item = ContextItem("fleet", suuid).to_item()
+    snapshot = dict(item)
+    assert ContextItem.from_item(item) == ContextItem("fleet", suuid)
+    assert item == snapshot
+
+
 def test_query_expression():
     query = ContextQuery("fleet")
     assert query.partition_key in query.expression()._values
 
 
+def test_query_expression_built_once():
+    query = ContextQuery("fleet")
+    assert query.expression() is query.expression()
+    assert query == ContextQuery("fleet")
+
+
+def test_pointer_filter():
+    values = PointerItem.filter_for()._values
+    assert values[0].name == BaseItem.sort_key_name()
+    assert values[1] == config["document_bucket"]["document_table"]["object_target"]
+
+
 def test_duplicate_keys_throw():
     data = bytes.fromhex("badbadbadbad")
     bonkers_context = {BaseItem.partition_key_name(): "kaboom"}
@@ -0,0 +1,117 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Builds the DynamoDB resource for the Document Bucket with a leaner response parser.
+"""
+
+import base64
+import os
+from typing import Any, Dict
+
+import boto3  # type: ignore
+import botocore.session  # type: ignore
+from boto3.dynamodb.types import Binary, TypeDeserializer  # type: ignore
+from botocore.loaders import Loader  # type: ignore
+from botocore.parsers import JSONParser, ResponseParserFactory  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+#: Shape type given to DynamoDB's AttributeMap; botocore parsers dispatch on
+#: "_handle_<type>", so this routes items to _AttributeMapParser._handle_attribute_map
+_ATTRIBUTE_MAP_TYPE = "attribute_map"
+
+
+class _WireTypeDeserializer(TypeDeserializer):
+    """
+    Deserializes AttributeValues straight from the JSON wire format, where binary
+    values are still base64 encoded.
+    """
+
+    def _deserialize_b(self, value):
+        return Binary(base64.b64decode(value))
+
+    def _deserialize_bs(self, value):
+        return set(self._deserialize_b(v) for v in value)
+
+
+class _AttributeMapLoader(Loader):
+    """
+    Loader that retypes the (output only) AttributeMap shape of the DynamoDB model.
+    """
+
+    def load_service_model(self, service_name, type_name, api_version=None):
+        model = super().load_service_model(service_name, type_name, api_version)
+        if service_name == "dynamodb" and type_name == "service-2":
+            model["shapes"]["AttributeMap"]["type"] = _ATTRIBUTE_MAP_TYPE
+        return model
+
+
+class _AttributeMapParser(JSONParser):
+    """
+    JSON parser that turns each returned item into Python types in one pass, instead
+    of walking every AttributeValue shape and then deserializing it again in boto3.
+    """
+
+    _deserializer = _WireTypeDeserializer()
+
+    def _parse_body_as_json(self, body_contents):
+        if orjson is None or not body_contents:
+            return super()._parse_body_as_json(body_contents)
+        try:
+            return orjson.loads(body_contents)
+        except orjson.JSONDecodeError:
+            # Let botocore build its usual error payload from the raw body
+            return super()._parse_body_as_json(body_contents)
+
+    def _handle_attribute_map(self, shape, value) -> Dict[str, Any]:
+        deserialize = self._deserializer.deserialize
+        item = {}
+        for name, attribute in value.items():
+            # Document Bucket records are all strings, so skip the generic dispatch
+            string = attribute.get("S")
+            item[name] = string if string is not None else deserialize(attribute)
+        return item
+
+
+class _AttributeMapParserFactory(ResponseParserFactory):
+    def create_parser(self, protocol_name):
+        if protocol_name == "json":
+            return _AttributeMapParser(**self._defaults)
+        return super().create_parser(protocol_name)
+
+
+def _attribute_map_loader(botocore_session) -> _AttributeMapLoader:
+    # Keep the session's data_path (AWS_DATA_PATH) search paths, as botocore's own
+    # create_loader does, so custom or updated service models still load
+    data_path = botocore_session.get_config_variable("data_path")
+    if data_path is None:
+        return _AttributeMapLoader()
+    paths = [
+        os.path.expanduser(os.path.expandvars(path))
+        for path in data_path.split(os.pathsep)
+    ]
+    return _AttributeMapLoader(extra_search_paths=paths)
+
+
+def dynamodb_resource(**kwargs):
+    """
+    Create a DynamoDB service resource whose items are parsed straight into Python
+    types. Only clients created from this resource are affected.
+
+    :param kwargs: additional arguments for :meth:`boto3.session.Session.resource`
+    :returns: a DynamoDB service resource
+    """
+    botocore_session = botocore.session.get_session()
+    botocore_session.register_component(
+        "data_loader", _attribute_map_loader(botocore_session)
+    )
+    botocore_session.register_component(
+        "response_parser_factory", _AttributeMapParserFactory()
+    )
+    return boto3.Session(botocore_session=botocore_session).resource(
+        "dynamodb", **kwargs
+    )